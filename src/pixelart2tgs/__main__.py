@@ -1,5 +1,6 @@
 import argparse
 from contextlib import contextmanager
+from dataclasses import asdict, replace
 import gzip
 import json
 from pathlib import Path
@@ -8,29 +9,48 @@ import traceback
 import numpy as np
 from PIL import Image
 
+from .complexity import (DOWNGRADE, REJECT, WARN, Limits, admit_source,
+                         get_limited_value)
 from .converter_types import *
-from .lottie_generator import generate_lottie
+from .chain_generator import SEAM_STRATEGIES, STROKE
+from .lottie_generator import (MAX_GAP, analyze_source,
+                               count_opacity_keyframes, estimate_paint_cost,
+                               render_lottie)
+from .profiles import FPS, PROFILES, SIZE_1MB, STICKER, Profile
 
-SIZE_64KB = 1 << 16
-SIZE_1MB = 1 << 20
-
-FPS = 60
 MS_PER_S = 1000
 
 MAX_S = 3
 MAX_FRAMES = FPS * MAX_S
 MAX_MS = MS_PER_S * MAX_S
 
-DEFAULT_LABEL = "Made by t.me/sliva0 script"
-
 SIZE_WARNING_TEMPLATE = (
-    "Warning: {}, which is why it isn't a valid telegram sticker. Lower the "
+    "Warning: {}, which is why it isn't a valid telegram {}. Lower the "
     "resolution and/or number of frames of the original file and try again.")
 
 LENGTH_WARNING_TEMPLATE = (
     f'Warning: file "{{}}" is longer than {MAX_S} seconds, '
     'so it will be sped up to fit within telegram limits.')
 
+COMPLEXITY_WARNING_TEMPLATE = (
+    'Warning: file "{}" exceeds the {} limit (estimated {}), so its '
+    "conversion can be slow and the result can be too large.")
+
+ADMISSION_MODES = (WARN, REJECT, DOWNGRADE, "off")
+
+LIMITS_HELP = {
+    "max_colors": "maximum amount of colors in one frame",
+    "max_components": "maximum amount of shapes in one frame",
+    "max_chains": "maximum estimated amount of groups in the result",
+    "max_keyframes": "maximum estimated amount of keyframes in the result",
+    "sample_size": "amount of frames analyzed by the complexity check",
+}
+
+USAGE = """%(prog)s -i infile [outfile] [-i ...] [-y] [-l LABEL] [-r] [-m]
+                    [-p PROFILE] [-s] [--max-gap N] [--seam SEAM]
+                    [--seam-report] [-a MODE] [--report] [--max-* N]
+                    [--sample-size N]"""
+
 DESCRIPTION = """
 Simple .gif to .tgs converter cli utility.
 
@@ -41,20 +61,81 @@ input.gif -> input.tgs
 $ %(prog)s -i first.gif -i second.gif sticker.tgs -y
 first.gif -> first.tgs
 second.gif -> "sticker.tgs
+
+$ %(prog)s -i input.gif -p sticker -p emoji
+input.gif -> input.tgs, input.emoji.tgs
 """
 
 
+def get_diff_box(previous: np.ndarray, frame: np.ndarray,
+                 box: BoxType) -> BoxType:
+    """
+    Narrows the update box down to the pixels that actually changed.
+    """
+    top, left, bottom, right = box
+    changed = np.any(previous[top:bottom, left:right] !=
+                     frame[top:bottom, left:right],
+                     axis=2)
+
+    rows = changed.any(axis=1).nonzero()[0]
+    cols = changed.any(axis=0).nonzero()[0]
+
+    if not rows.size:
+        return (0, 0, 0, 0)  # empty box, nothing changed
+
+    return (int(top + rows[0]), int(left + cols[0]),
+            int(top + rows[-1] + 1), int(left + cols[-1] + 1))
+
+
+def get_gif_box(image: Image.Image, last_disposal) -> Optional[BoxType]:
+    """
+    Gets the area of the current frame that can differ from the previous
+    one: extents of the frame data and the area cleared by disposal
+    of the previous frame. Returns None if there is no such information.
+    """
+    extents = [tile[1] for tile in image.tile]
+    if image.format != "GIF" or not extents:
+        return None
+
+    if last_disposal is not None:
+        extents.append(last_disposal)
+
+    # pillow extents are (left, top, right, bottom)
+    left, top, _, _ = map(int, np.min(extents, axis=0))
+    _, _, right, bottom = map(int, np.max(extents, axis=0))
+    return (top, left, bottom, right)
+
+
 def open_gif_file(path) -> SourceAnimationType:
     image = Image.open(path)
     durations = []
     frames = []
+    boxes: UpdateBoxesType = []
+    last_disposal = None
 
     for frame_index in range(image.n_frames):
         image.seek(frame_index)
 
+        # tile info is lost after the frame is loaded
+        box = get_gif_box(image, last_disposal)
+
         durations.append(image.info["duration"])
         frames.append(np.array(image.convert("RGBA")))
 
+        if frame_index == 0:
+            boxes.append(None)
+        else:
+            if box is None:
+                # no info from decoder, so the whole frame is compared
+                box = (0, 0, *frames[-1].shape[:2])
+            boxes.append(get_diff_box(frames[-2], frames[-1], box))
+
+        # restoring disposal methods clear the frame area before the next one
+        if getattr(image, "disposal_method", 0) in (2, 3):
+            last_disposal = image.dispose_extent
+        else:
+            last_disposal = None
+
     if (total_duration := sum(durations)) > MAX_MS:
         print(LENGTH_WARNING_TEMPLATE.format(path))
         # converts milliseconds into frames amount
@@ -64,26 +145,34 @@ def open_gif_file(path) -> SourceAnimationType:
         # just converts milliseconds into frames amount
         durations = [d * FPS / MS_PER_S for d in durations]
 
-    return durations, frames
+    return durations, frames, boxes
 
 
-def save_tgs(lottie, path: Path):
-    compressed_json = json.dumps(
+def dump_lottie(lottie) -> str:
+    return json.dumps(
         lottie,
         ensure_ascii=False,
         separators=(',', ':'),
     )
 
+
+def get_tgs_size(lottie) -> int:
+    return len(gzip.compress(dump_lottie(lottie).encode('utf-8'), 9))
+
+
+def save_tgs(lottie, path: Path, profile: Profile = STICKER):
+    compressed_json = dump_lottie(lottie)
+
     with gzip.open(path, 'wb', compresslevel=9) as file:
         file.write(compressed_json.encode('utf-8'))
 
     if len(compressed_json) > SIZE_1MB:
         msg = f'raw data of file "{path}" is larger than 1Mb'
-        print(SIZE_WARNING_TEMPLATE.format(msg))
+        print(SIZE_WARNING_TEMPLATE.format(msg, profile.name))
 
-    elif path.stat().st_size > SIZE_64KB:
-        msg = f'file "{path}" is larger than 64Kb'
-        print(SIZE_WARNING_TEMPLATE.format(msg))
+    elif path.stat().st_size > profile.max_size:
+        msg = f'file "{path}" is larger than {profile.max_size >> 10}Kb'
+        print(SIZE_WARNING_TEMPLATE.format(msg, profile.name))
 
 
 class IOFiles(argparse.Action):
@@ -125,11 +214,25 @@ class IOFiles(argparse.Action):
         setattr(namespace, self.dest, items)
 
 
+def non_negative_int(value: str) -> int:
+    number = int(value)
+    if number < 0:
+        raise argparse.ArgumentTypeError(f"can't be negative, got {number}")
+    return number
+
+
+def positive_int(value: str) -> int:
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be positive, got {number}")
+    return number
+
+
 def get_args():
     parser = argparse.ArgumentParser(
         prog="pixelart2tgs",
         description=DESCRIPTION,
-        usage="%(prog)s -i infile [outfile] [-i ...] [-y] [-l LABEL]",
+        usage=USAGE,
         formatter_class=argparse.RawTextHelpFormatter,
     )
     parser.add_argument(
@@ -150,13 +253,104 @@ def get_args():
     parser.add_argument(
         "-l",
         dest="label",
-        default=DEFAULT_LABEL,
         help="name that can be read when unpacking "
         "the sticker by third-party programs",
     )
+    parser.add_argument(
+        "-r",
+        dest="canonicalize",
+        action="store_true",
+        help="treat flipped and rotated copies of a shape as the same "
+        "shape,\nwhich can reduce the size of sprites that turn around",
+    )
+    parser.add_argument(
+        "-m",
+        dest="group_motion",
+        action="store_true",
+        help="animate shapes that move together with one shared "
+        "transform,\nwhich can reduce the size of moving multi-color sprites",
+    )
+    parser.add_argument(
+        "-p",
+        dest="profiles",
+        action="append",
+        choices=PROFILES,
+        help="output profile, can be repeated to make several files from\n"
+        "one conversion, non-sticker profiles add their name to the\n"
+        "output file name (default: sticker)",
+    )
+    parser.add_argument(
+        "-s",
+        dest="layered",
+        action="store_true",
+        help="put shapes into layers that exist only while the shapes\n"
+        "are visible, instead of hiding them by opacity keyframes,\n"
+        "and print the change of opacity keyframes and file size",
+    )
+    parser.add_argument(
+        "--max-gap",
+        dest="max_gap",
+        type=non_negative_int,
+        default=MAX_GAP,
+        metavar="N",
+        help="with -s, split shapes missing for more than N frames\n"
+        "into separate layers (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--seam",
+        default=STROKE,
+        choices=SEAM_STRATEGIES,
+        help="way of hiding seams between adjacent shapes: stroke around\n"
+        "every shape, slightly enlarged shapes, stroke only on edges\n"
+        "bordering other shapes or nothing (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--seam-report",
+        action="store_true",
+        help="print file size and estimated drawing cost of every\n"
+        "seam hiding way",
+    )
+    parser.add_argument(
+        "-a",
+        dest="admission",
+        default=WARN,
+        choices=ADMISSION_MODES,
+        help="what to do with input files that exceed complexity limits:\n"
+        "print a warning, skip them, reduce their colors and frames\n"
+        "or don't check them at all (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--report",
+        action="store_true",
+        help="print the complexity check result of every input file\n"
+        "as a json line, nothing is checked and printed with -a off",
+    )
+    for name, default in asdict(Limits()).items():
+        parser.add_argument(
+            "--" + name.replace("_", "-"),
+            dest=name,
+            type=positive_int,
+            default=default,
+            metavar="N",
+            help=LIMITS_HELP[name] + "\n(default: %(default)s)",
+        )
     return parser.parse_args()
 
 
+def get_limits(args) -> Limits:
+    return Limits(**{name: getattr(args, name) for name in asdict(Limits())})
+
+
+def get_profiles(args) -> list[Profile]:
+    profiles = [PROFILES[name] for name in args.profiles or [STICKER.name]]
+
+    if args.label is not None:
+        profiles = [replace(profile, label=args.label) for profile in profiles]
+
+    # removes duplicates keeping the order
+    return list(dict.fromkeys(profiles))
+
+
 @contextmanager
 def error_handling(process_name: str):
     try:
@@ -167,27 +361,135 @@ def error_handling(process_name: str):
         exit(1)
 
 
+def admit_file(args, infile: Path,
+               source: SourceAnimationType) -> Optional[SourceAnimationType]:
+    """
+    Checks complexity of the source according to the cli arguments.
+    Returns the source to convert or None if it is rejected.
+    """
+    if args.admission == "off":
+        return source
+
+    admission, source = admit_source(source, get_limits(args),
+                                     args.admission)
+
+    if args.report:
+        print(json.dumps({"file": str(infile), **admission.as_dict()}))
+
+    if admission.decision in (WARN, REJECT):
+        value = get_limited_value(admission.estimate, admission.reason)
+
+        if admission.decision == WARN:
+            print(
+                COMPLEXITY_WARNING_TEMPLATE.format(infile, admission.reason,
+                                                   value))
+        else:
+            print(f'"{infile}" rejected: {admission.reason} '
+                  f'limit exceeded (estimated {value}).')
+            return None
+
+    elif admission.decision == DOWNGRADE:
+        print(f'"{infile}" downgraded: {", ".join(admission.downgrades)}.')
+
+    return source
+
+
+def print_layers_report(args, analysis, profile: Profile, lottie):
+    """
+    Compares layered lottie json with the one made without layers.
+    """
+    plain = render_lottie(analysis,
+                          profile,
+                          args.group_motion,
+                          seam=args.seam)
+
+    print(f"Opacity keyframes: {count_opacity_keyframes(plain)} -> "
+          f"{count_opacity_keyframes(lottie)}, layers: "
+          f"{len(lottie['layers'])}, file size: {get_tgs_size(plain)} -> "
+          f"{get_tgs_size(lottie)} bytes.")
+
+
+def print_seam_report(args, analysis, profile: Profile):
+    """
+    Compares results of all seam hiding ways.
+    """
+    for seam in SEAM_STRATEGIES:
+        lottie = render_lottie(analysis, profile, args.group_motion,
+                               args.layered, args.max_gap, seam)
+        operations, painted = estimate_paint_cost(lottie)
+
+        print(f"Seam {seam!r}: file size {get_tgs_size(lottie)} bytes, "
+              f"{operations} paint operations "
+              f"of {painted} path vertices per frame.")
+
+
 def main():
     args = get_args()
+    profiles = get_profiles(args)
+    rejected = False
 
     for infile, outfile in args.input:
-        if not args.force_overwrite and outfile.exists():
-            question = f'File "{outfile}" already exists. Overwrite? [y/n] '
+        targets = []
+
+        for profile in profiles:
+            path = profile.output_path(outfile)
+
+            if not args.force_overwrite and path.exists():
+                question = f'File "{path}" already exists. Overwrite? [y/n] '
 
-            if input(question).strip().lower() != "y":
-                print(f'"{infile}" -> "{outfile}" skipped.')
-                continue
+                if input(question).strip().lower() != "y":
+                    print(f'"{infile}" -> "{path}" skipped.')
+                    continue
+
+            targets.append((profile, path))
+
+        if not targets:
+            continue
 
         with error_handling("File reading"):
             source = open_gif_file(infile)
 
-        with error_handling("Data conversion"):
-            lottie = generate_lottie(source, args.label)  # type: ignore
+        with error_handling("Complexity check"):
+            source = admit_file(args, infile, source)  # type: ignore
 
-        with error_handling("File saving"):
-            save_tgs(lottie, outfile)  # type: ignore
+        if source is None:
+            rejected = True
+            continue
 
-        print(f'File "{outfile}" saved.')
+        with error_handling("Data conversion"):
+            analysis = analyze_source(source, args.canonicalize)  # type: ignore
+
+        for profile, path in targets:
+            with error_handling("Data conversion"):
+                lottie = render_lottie(
+                    analysis,  # type: ignore
+                    profile,
+                    args.group_motion,
+                    args.layered,
+                    args.max_gap,
+                    args.seam,
+                )
+
+            with error_handling("File saving"):
+                save_tgs(lottie, path, profile)  # type: ignore
+
+            print(f'File "{path}" saved.')
+
+            if args.layered:
+                with error_handling("Data conversion"):
+                    print_layers_report(
+                        args,
+                        analysis,  # type: ignore
+                        profile,
+                        lottie,  # type: ignore
+                    )
+
+            if args.seam_report:
+                with error_handling("Data conversion"):
+                    print_seam_report(args, analysis, profile)  # type: ignore
+
+    if rejected:
+        exit(2)
 
 
 if __name__ == "__main__":
@@ -1,6 +1,33 @@
 from .converter_types import *
 from . import templates
 
+from .contour_generator import (dilate_contour, get_unit_edges,
+                                join_segments, merge_edges)
+
+# strategies of hiding anti-aliasing seams between adjacent shapes
+STROKE = "stroke"  # half transparent stroke around every shape
+DILATE = "dilate"  # shapes are slightly enlarged to overlap
+EDGE = "edge"  # stroke only on edges bordering other shapes
+NONE = "none"  # seams aren't hidden
+
+SEAM_STRATEGIES = (STROKE, DILATE, EDGE, NONE)
+
+DILATION = 0.25  # in pixels of the final animation
+
+
+def get_contours_size(contours: list[ContourType]) -> PosType:
+    """
+    Gets size of the shape, which is the bottom right corner of its contours.
+    """
+    return tuple(np.max([np.max(c, axis=0) for c in contours], axis=0))
+
+
+def lottify_point(point: tuple[float, float]) -> tuple[float, float]:
+    """
+    Converts fractional point from converter format to lottie format.
+    """
+    return tuple(round(float(i), 3) for i in point)[::-1]
+
 
 def lottify_pos(position: PosType) -> LottiePosType:
     """
@@ -9,6 +36,14 @@ def lottify_pos(position: PosType) -> LottiePosType:
     return tuple(map(int, position))[::-1]
 
 
+def lottify_placement(frame: FormPosColor, size: PosType) -> LottiePosType:
+    """
+    Converts position of possibly flipped or rotated shape to lottie format,
+    compensating the shift of the shape caused by its transform.
+    """
+    return lottify_pos(np.add(frame.pos, frame.transform.offset(size)))
+
+
 def lottify_color(color: ColorType) -> LottieColorType:
     """
     Converts color from converter format to lottie format.
@@ -76,32 +111,226 @@ class Chain:
 
         self.frames.append(closest)
 
-    def generate_group(self, contours: list[ContourType],
-                       durations: DurationsType, scale: float):
+    def split(self, max_gap: int) -> list["Chain"]:
+        """
+        Splits the chain into chains without gaps (frames where the shape
+        is missing) longer than `max_gap` frames. Gaps at the end of the
+        chain are dropped.
+        """
+        if max_gap < 0:
+            raise ValueError(f"max_gap can't be negative, got {max_gap}")
+
+        chains = []
+        start = last = None
+
+        for index, frame in enumerate(self.frames + [None] * (max_gap + 1)):
+            if frame is not None:
+                if start is None:
+                    start = index
+                last = index
+            elif start is not None and index - last > max_gap:
+                chain = Chain(self.keyframe_shift + start, self.frames[start])
+                chain.frames = self.frames[start:last + 1]
+                chains.append(chain)
+                start = None
+
+        return chains
+
+    def resample(self, kept: list[int]) -> Optional["Chain"]:
+        """
+        Moves the chain to a timeline, that consists only of `kept` frames
+        of the original one. Returns None if the shape is missing
+        in all kept frames.
+        """
+        end = self.keyframe_shift + len(self.frames)
+        frames = [
+            self.frames[index - self.keyframe_shift]
+            if self.keyframe_shift <= index < end else None for index in kept
+        ]
+
+        start = next((i for i, frame in enumerate(frames) if frame), None)
+        if start is None:
+            return None
+
+        chain = Chain(start, frames[start])
+        chain.frames = frames[start:]
+        return chain
+
+    def span(self, durations: DurationsType) -> tuple[float, float]:
+        """
+        Calculates time of the first and after the last frame of the chain.
+        """
+        end = self.keyframe_shift + len(self.frames)
+        return (round(sum(durations[:self.keyframe_shift]), 1),
+                round(sum(durations[:end]), 1))
+
+    def lottify_positions(
+            self, contours: list[ContourType]) -> list[Optional[LottiePosType]]:
+        """
+        Converts positions of every chain frame to lottie format,
+        None is left for frames where the shape is missing.
+        """
+        size = get_contours_size(contours)
+
+        return [
+            frame and lottify_placement(frame, size) for frame in self.frames
+        ]
+
+    def motion(self, contours: list[ContourType]):
+        """
+        Calculates hashable description of the chain movement: start frame
+        and position deltas relative to the first frame.
+        Chains with equal motion move together as one rigid body.
+        """
+        positions = self.lottify_positions(contours)
+        start_x, start_y = positions[0]  # chain always starts with a shape
+
+        deltas = tuple(pos and (pos[0] - start_x, pos[1] - start_y)
+                       for pos in positions)
+        return self.keyframe_shift, deltas
+
+    def find_seam_edges(
+            self, contours: list[ContourType],
+            frames: list[np.ndarray]) -> list[tuple[PosType, PosType]]:
+        """
+        Finds contour edges that border a pixel of another shape in any
+        frame of the chain, since edges bordering transparent pixels
+        don't make seams. Returns segments of such edges.
+        """
+        starts, directions = get_unit_edges(contours)
+        size = get_contours_size(contours)
+
+        # outward normal of the edge is its direction turned left
+        normals = np.stack([-directions[:, 1], directions[:, 0]], axis=1)
+        # centers of pixels outside of every edge (see `generate_borders`)
+        centers = starts - (normals - directions + 1) // 2 + normals + 0.5
+
+        seam = np.zeros(len(starts), dtype=bool)
+
+        for index, element in enumerate(self.frames):
+            if element is None:
+                continue
+
+            frame = frames[self.keyframe_shift + index]
+            height, width = frame.shape[:2]
+
+            # places pixels the same way as group transform does
+            transform = element.transform
+            placed = (centers @ transform.matrix.T +
+                      transform.offset(size) + element.pos)
+            rows, cols = np.floor(placed).astype(int).T
+
+            inside = (rows >= 0) & (rows < height) & (cols >= 0) & (cols <
+                                                                  width)
+            seam[inside] |= frame[rows[inside], cols[inside], 3] != 0
+
+        return merge_edges(starts[seam], directions[seam])
+
+    def generate_opacity(self, durations: DurationsType,
+                         layered: bool = False):
+        """
+        Generates lottie opacity value, that hides the chain
+        in frames where the shape is missing.
+
+        If `layered` is set, the chain is meant to be placed into a layer
+        that exists only during the chain `span`, so frames before
+        the chain aren't hidden by opacity.
+        """
+        opacity_values = [(100 if frame else 0) for frame in self.frames]
+
+        if layered:
+            time_shift = sum(durations[:self.keyframe_shift])
+            shifted_durations = durations[self.keyframe_shift:]
+            return lottify_value(opacity_values, time_shift,
+                                 shifted_durations)
+
+        opacity_values = [0] * self.keyframe_shift + opacity_values
+        return lottify_value(opacity_values, 0, durations)
+
+    def generate_position(self, contours: list[ContourType],
+                          durations: DurationsType):
+        """
+        Generates lottie position value of the chain.
+        """
+        time_shift = sum(durations[:self.keyframe_shift])
+        shifted_durations = durations[self.keyframe_shift:]
+
+        pos_values = self.lottify_positions(contours)
+        return lottify_value(pos_values, time_shift, shifted_durations)
+
+    def generate_group(self,
+                       contours: list[ContourType],
+                       durations: DurationsType,
+                       scale: float,
+                       parent_pos: Optional[LottiePosType] = None,
+                       layered: bool = False,
+                       seam: str = STROKE,
+                       frames: Optional[list[np.ndarray]] = None):
         """
         Generates lottie group from chain.
+
+        If `parent_pos` is passed, the group is meant to be nested
+        into a parent group that animates position and opacity,
+        so the group gets static position relative to the parent.
+
+        For `layered` see `generate_opacity`.
+
+        `seam` is one of `SEAM_STRATEGIES`, `EDGE` strategy requires
+        source `frames` to find edges bordering other shapes.
         """
         time_shift = sum(durations[:self.keyframe_shift])
         shifted_durations = durations[self.keyframe_shift:]
 
-        opacity_values = [(100 if frame else 0) for frame in self.frames]
-        opacity_values = [0] * self.keyframe_shift + opacity_values
+        if parent_pos is None:
+            opacity = self.generate_opacity(durations, layered)
+            position = self.generate_position(contours, durations)
+        else:
+            x, y = self.lottify_positions(contours)[0]
+            opacity = templates.static_value(100)
+            position = templates.static_value(
+                (x - parent_pos[0], y - parent_pos[1]))
 
-        pos_values = [
-            frame and lottify_pos(frame.pos) for frame in self.frames
-        ]
         color_values = [
             frame and lottify_color(frame.color) for frame in self.frames
         ]
-
-        opacity = lottify_value(opacity_values, 0, durations)
-        position = lottify_value(pos_values, time_shift, shifted_durations)
         color = lottify_value(color_values, time_shift, shifted_durations)
 
-        lottie_contours = [
-            templates.contour(list(map(lottify_pos, contour)))
-            for contour in contours
-        ]
+        flip = rotation = None
+        # flip and rotation are written only if the shape is ever transformed
+        if any(frame and frame.transform != Transform.R0
+               for frame in self.frames):
+            scale_values = [
+                frame and frame.transform.lottie_scale for frame in self.frames
+            ]
+            rotation_values = [
+                frame and frame.transform.lottie_rotation
+                for frame in self.frames
+            ]
+            flip = lottify_value(scale_values, time_shift, shifted_durations)
+            rotation = lottify_value(rotation_values, time_shift,
+                                     shifted_durations)
+
+        if seam == DILATE:
+            lottie_contours = [
+                templates.contour(
+                    list(
+                        map(lottify_point,
+                            dilate_contour(contour, DILATION / scale))))
+                for contour in contours
+            ]
+        else:
+            lottie_contours = [
+                templates.contour(list(map(lottify_pos, contour)))
+                for contour in contours
+            ]
+
+        edges = None
+        if seam == EDGE:
+            segments = self.find_seam_edges(contours, frames)
+            edges = [
+                templates.contour(list(map(lottify_pos, polyline)), False)
+                for polyline in join_segments(segments)
+            ]
 
         return templates.group(
             lottie_contours,
@@ -109,6 +338,10 @@ class Chain:
             color,
             opacity,
             position,
+            flip,
+            rotation,
+            seam == STROKE,
+            edges,
         )
 
 
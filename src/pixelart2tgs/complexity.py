@@ -0,0 +1,296 @@
+from collections import Counter
+from dataclasses import asdict, dataclass, field
+
+from scipy import ndimage
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+from .converter_types import *
+from .shape_generator import (get_frame_colors, normalize_shape,
+                              unpack_source)
+
+# admission decisions, the last three are also the ways
+# of handling animations exceeding the limits
+ACCEPT = "accept"
+WARN = "warn"
+REJECT = "reject"
+DOWNGRADE = "downgrade"
+
+# names of limits and estimate fields they check, in order of checking
+LIMITED_FIELDS = {
+    "max_colors": "colors",
+    "max_components": "components",
+    "max_chains": "chains",
+    "max_keyframes": "keyframes",
+}
+
+
+@dataclass(frozen=True)
+class Limits:
+    """
+    Dataclass with limits of the animation complexity,
+    that can be converted in reasonable time and size.
+    """
+    max_colors: int = 256  # per frame
+    max_components: int = 2000  # per frame
+    max_chains: int = 5000
+    max_keyframes: int = 50000
+    sample_size: int = 8  # amount of analyzed frames
+
+    def __post_init__(self):
+        for name, value in asdict(self).items():
+            if value < 1:
+                raise ValueError(f"{name} must be positive, got {value}")
+
+
+@dataclass(frozen=True)
+class Estimate:
+    """
+    Dataclass with estimated complexity of the animation conversion.
+    Colors and components are maximums over analyzed frames,
+    chains and keyframes are projected to the whole animation
+    (they are left zero if colors or components already exceed limits).
+    """
+    frames: int
+    sampled: int
+    colors: int
+    components: int
+    chains: int = 0
+    keyframes: int = 0
+
+
+@dataclass(frozen=True)
+class Admission:
+    """
+    Dataclass with the decision about the animation conversion.
+
+    `reason` is the exceeded limit (like "max_components") or None,
+    `downgrades` lists changes made to the animation to fit the limits.
+    """
+    decision: str
+    estimate: Estimate
+    reason: Optional[str] = None
+    downgrades: tuple[str, ...] = field(default_factory=tuple)
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+def label_frame(frame: np.ndarray) -> tuple[np.ndarray, int]:
+    """
+    Labels all same color components of the frame at once, by searching
+    connected components of a graph with edges between adjacent pixels
+    of the same color. Transparent pixels get label -1.
+    Returns labels matrix and the amount of visible components.
+    """
+    height, width = frame.shape[:2]
+    pixels = frame.view(np.uint32).reshape(height, width)  # RGBA as one int
+    index = np.arange(height * width).reshape(height, width)
+
+    # right and bottom neighbours with the same color
+    horizontal = pixels[:, :-1] == pixels[:, 1:]
+    vertical = pixels[:-1, :] == pixels[1:, :]
+    rows = np.concatenate([index[:, :-1][horizontal], index[:-1][vertical]])
+    cols = np.concatenate([index[:, 1:][horizontal], index[1:][vertical]])
+
+    graph = coo_matrix((np.ones(rows.size), (rows, cols)),
+                       shape=(height * width, ) * 2)
+    _, labels = connected_components(graph, directed=False)
+    labels = labels.reshape(height, width)
+
+    # renumbers visible components from 0, transparent ones get -1
+    visible = frame[:, :, 3] != 0
+    unique, labels[visible] = np.unique(labels[visible], return_inverse=True)
+    labels[~visible] = -1
+    return labels, unique.size
+
+
+def count_shapes(labels: np.ndarray) -> Counter:
+    """
+    Counts components of every shape in the labeled frame.
+    """
+    shapes: Counter = Counter()
+    # find_objects skips 0, so labels are shifted by 1
+    for number, bounds in enumerate(ndimage.find_objects(labels + 1)):
+        shape, _ = normalize_shape(labels[bounds] == number)
+        shapes[shape] += 1
+    return shapes
+
+
+def count_updated(labels: np.ndarray, box: Optional[BoxType]) -> int:
+    """
+    Counts components of the labeled frame touching its update box.
+    """
+    if box is not None:
+        top, left, bottom, right = box
+        labels = labels[top:bottom, left:right]
+    return np.count_nonzero(np.unique(labels) >= 0)
+
+
+def estimate_complexity(source: SourceAnimationType,
+                        limits: Limits = Limits()) -> Estimate:
+    """
+    Estimates the conversion complexity from a few evenly spaced frames.
+
+    Chains are projected as a sum of maximum amounts of every shape
+    in one frame (that's how `generate_chains` creates them).
+    Keyframes are projected as three start keyframes per chain (position,
+    color and opacity) and one more for every component touching
+    the update box of the frame.
+    """
+    _, frames, boxes = unpack_source(source)
+    amount = len(frames)
+    sample = np.unique(
+        np.linspace(0, amount - 1, min(amount, limits.sample_size)).round())
+
+    colors = components = 0
+    labeled = []
+    updated = []
+
+    for frame_index in sample.astype(int):
+        frame = frames[frame_index]
+        labels, frame_components = label_frame(frame)
+        labeled.append(labels)
+
+        colors = max(colors, len(get_frame_colors(frame)))
+        components = max(components, frame_components)
+
+        if frame_index > 0:
+            updated.append(count_updated(labels, boxes[frame_index]))
+
+    if colors > limits.max_colors or components > limits.max_components:
+        return Estimate(amount, len(sample), colors, components)
+
+    shapes: Counter = Counter()
+    for labels in labeled:
+        shapes |= count_shapes(labels)  # keeps maximum of every shape
+
+    chains = sum(shapes.values())
+    # average amount of updated components multiplied by amount of updates
+    updates = sum(updated) / len(updated) * (amount - 1) if updated else 0
+    keyframes = chains * 3 + round(updates)
+
+    return Estimate(amount, len(sample), colors, components, chains,
+                    keyframes)
+
+
+def check_limits(estimate: Estimate, limits: Limits) -> Optional[str]:
+    """
+    Gets the name of the first exceeded limit or None.
+    """
+    for name, estimated in LIMITED_FIELDS.items():
+        if getattr(estimate, estimated) > getattr(limits, name):
+            return name
+    return None
+
+
+def get_limited_value(estimate: Estimate, limit: str) -> int:
+    """
+    Gets the estimated value checked by the limit with given name.
+    """
+    return getattr(estimate, LIMITED_FIELDS[limit])
+
+
+def posterize_source(source: SourceAnimationType,
+                     bits: int) -> SourceAnimationType:
+    """
+    Reduces colors by keeping only the highest `bits` bits of every color
+    channel. Alpha channel is left as is. The same color always turns into
+    the same color, so update boxes stay valid.
+    """
+    durations, frames, boxes = unpack_source(source)
+    mask = np.array([256 - (1 << (8 - bits))] * 3 + [255], dtype=np.uint8)
+    return durations, [frame & mask for frame in frames], boxes
+
+
+def merge_boxes(boxes: UpdateBoxesType) -> Optional[BoxType]:
+    """
+    Gets box that covers all boxes, empty boxes are skipped.
+    """
+    if any(box is None for box in boxes):
+        return None
+
+    boxes = [box for box in boxes if box[0] < box[2] and box[1] < box[3]]
+    if not boxes:
+        return (0, 0, 0, 0)
+
+    tops, lefts, bottoms, rights = zip(*boxes)
+    return (min(tops), min(lefts), max(bottoms), max(rights))
+
+
+def decimate_source(source: SourceAnimationType,
+                    step: int) -> SourceAnimationType:
+    """
+    Keeps only every `step`-th frame, extending it by durations
+    of the dropped frames that follow it.
+    """
+    durations, frames, boxes = unpack_source(source)
+    starts = range(0, len(frames), step)
+
+    return (
+        [sum(durations[i:i + step]) for i in starts],
+        [frames[i] for i in starts],
+        [boxes[0]] + [merge_boxes(boxes[i - step + 1:i + 1])
+                      for i in starts[1:]],
+    )
+
+
+def admit_source(
+    source: SourceAnimationType,
+    limits: Limits = Limits(),
+    exceeded: str = REJECT,
+) -> tuple[Admission, SourceAnimationType]:
+    """
+    Decides whether the animation can be converted within the limits.
+
+    `exceeded` is the way of handling an animation that exceeds the limits:
+    with `WARN` it is converted anyway and gets `WARN` decision, with
+    `REJECT` it gets `REJECT` decision. With `DOWNGRADE`, colors are
+    posterized and frames are dropped until the estimate fits the limits,
+    the changed animation is returned with `DOWNGRADE` decision, or with
+    `REJECT` decision if nothing helps.
+    """
+    estimate = estimate_complexity(source, limits)
+    reason = check_limits(estimate, limits)
+
+    if reason is None:
+        return Admission(ACCEPT, estimate), source
+
+    if exceeded != DOWNGRADE:
+        return Admission(exceeded, estimate, reason), source
+
+    downgrades = []
+    bits = 8
+    downgraded = source
+    current = estimate
+    current_reason = reason
+
+    while current_reason is not None:
+        if current_reason in ("max_colors", "max_components") and bits > 1:
+            bits -= 1
+            downgraded = posterize_source(downgraded, bits)
+            downgrades.append(f"posterize:{bits}")
+        elif (current_reason in ("max_chains", "max_keyframes")
+              and len(downgraded[1]) > 1):
+            # every step halves the frame rate
+            downgraded = decimate_source(downgraded, 2)
+            downgrades.append("decimate:2")
+        else:
+            break
+
+        previous = current
+        current = estimate_complexity(downgraded, limits)
+
+        if current_reason in ("max_chains", "max_keyframes"):
+            if (get_limited_value(current, current_reason)
+                    >= get_limited_value(previous, current_reason)):
+                break  # dropping more frames won't help either
+
+        current_reason = check_limits(current, limits)
+
+    if current_reason is not None:
+        # the original animation is reported, not the remnant of it
+        return Admission(REJECT, estimate, reason, tuple(downgrades)), source
+
+    return Admission(DOWNGRADE, current, None,
+                     tuple(downgrades)), downgraded
@@ -152,3 +152,117 @@ def generate_contours(shape: ShapeType) -> list[ContourType]:
         cycles.append(generate_cycle(borders))
         
     return cycles
+
+
+def dilate_contour(contour: ContourType,
+                   amount: float) -> list[tuple[float, float]]:
+    """
+    Moves every contour vertex outward from the shape by `amount`,
+    so that adjacent shapes slightly overlap and no seams are visible
+    between them. Contours of holes are moved into the hole.
+    """
+    points = np.array(contour)
+    incoming = np.sign(points - np.roll(points, 1, axis=0))
+    outgoing = np.sign(np.roll(points, -1, axis=0) - points)
+
+    # outward normal of border arrow is its direction turned left
+    # (see `generate_borders`), (row, col) -> (-col, row)
+    incoming_normals = np.stack([-incoming[:, 1], incoming[:, 0]], axis=1)
+    outgoing_normals = np.stack([-outgoing[:, 1], outgoing[:, 0]], axis=1)
+
+    # vertices on a straight line are moved only once
+    straight = np.all(incoming == outgoing, axis=1)
+    shifts = incoming_normals + outgoing_normals
+    shifts[straight] = incoming_normals[straight]
+
+    return list(map(tuple, points + shifts * amount))
+
+
+def get_unit_edges(
+        contours: list[ContourType]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Splits contours into edges of one pixel length.
+    Returns arrays of start points and directions of the edges.
+    """
+    starts = []
+    directions = []
+
+    for contour in contours:
+        # contour is cycled, so the last point is connected to the first one
+        for start, end in zip(contour, contour[1:] + contour[:1]):
+            length = abs(end[0] - start[0]) + abs(end[1] - start[1])
+            direction = ((end[0] - start[0]) // length,
+                         (end[1] - start[1]) // length)
+
+            for step in range(length):
+                starts.append((start[0] + direction[0] * step,
+                               start[1] + direction[1] * step))
+                directions.append(direction)
+
+    return np.array(starts), np.array(directions)
+
+
+def merge_edges(starts: np.ndarray,
+                directions: np.ndarray) -> list[tuple[PosType, PosType]]:
+    """
+    Merges adjacent edges of one pixel length lying on the same line
+    into segments.
+    """
+    lines: defaultdict[tuple, list[int]] = defaultdict(list)
+
+    for start, direction in zip(starts, directions):
+        begin = np.minimum(start, start + direction)
+        axis = 0 if direction[0] else 1  # coordinate changing along the edge
+        lines[axis, int(begin[1 - axis])].append(int(begin[axis]))
+
+    segments = []
+
+    for (axis, line), coords in lines.items():
+        coords.sort()
+        first = last = coords[0]
+
+        for coord in coords[1:] + [None]:
+            if coord == last + 1:
+                last = coord
+                continue
+
+            # (row, col) of segment ends on the line
+            ends = [(first, line), (last + 1, line)]
+            if axis:
+                ends = [end[::-1] for end in ends]
+            segments.append(tuple(ends))
+
+            first = last = coord
+
+    return segments
+
+
+def join_segments(
+        segments: list[tuple[PosType, PosType]]) -> list[list[PosType]]:
+    """
+    Joins segments sharing ends into polylines.
+    """
+    ends: defaultdict[PosType, set[int]] = defaultdict(set)
+    for index, (start, end) in enumerate(segments):
+        ends[start].add(index)
+        ends[end].add(index)
+
+    unused = set(range(len(segments)))
+    polylines = []
+
+    while unused:
+        index = unused.pop()
+        polyline = list(segments[index])
+
+        # extends polyline from both sides while possible
+        for _ in range(2):
+            while unused_ends := ends[polyline[-1]] & unused:
+                index = unused_ends.pop()
+                unused.remove(index)
+                start, end = segments[index]
+                polyline.append(end if start == polyline[-1] else start)
+            polyline.reverse()
+
+        polylines.append(polyline)
+
+    return polylines
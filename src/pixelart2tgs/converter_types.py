@@ -1,6 +1,7 @@
 from collections import defaultdict
-from dataclasses import dataclass
-from typing import Optional
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Optional, Union
 
 import numpy as np
 
@@ -14,7 +15,67 @@ ShapeType = frozenset[PosType]
 ContourType = list[PosType]
 DurationsType = list[float]
 
-SourceAnimationType = tuple[DurationsType, list[np.ndarray]]
+# (top, left, bottom, right) rectangle of the frame, bottom and right
+# are exclusive, None means that the whole frame is updated
+BoxType = tuple[int, int, int, int]
+UpdateBoxesType = list[Optional[BoxType]]
+
+# update boxes are optional, without them every frame is segmented entirely
+SourceAnimationType = Union[
+    tuple[DurationsType, list[np.ndarray]],
+    tuple[DurationsType, list[np.ndarray], UpdateBoxesType],
+]
+
+
+class Transform(Enum):
+    """
+    Enumeration of all 8 flips and rotations of a shape.
+
+    Value is a pair of clockwise rotation angle in degrees and horizontal
+    flip flag, lottie applies flip (negative scale) before rotation.
+    """
+    R0 = (0, False)  # identity
+    R90 = (90, False)
+    R180 = (180, False)
+    R270 = (270, False)
+    F0 = (0, True)  # mirrored
+    F90 = (90, True)
+    F180 = (180, True)
+    F270 = (270, True)
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """
+        Transformation matrix in converter (row, column) coordinates.
+        It is orthogonal, so transposed matrix is the inverse transform.
+        """
+        angle, flip = self.value
+        cos, sin = {0: (1, 0), 90: (0, 1), 180: (-1, 0), 270: (0, -1)}[angle]
+        sign = -1 if flip else 1
+        return np.array([[cos, sin * sign], [-sin, cos * sign]])
+
+    @property
+    def lottie_scale(self) -> tuple[int, int]:
+        return (-100 if self.value[1] else 100, 100)
+
+    @property
+    def lottie_rotation(self) -> int:
+        return self.value[0]
+
+    def placed_size(self, size: PosType) -> PosType:
+        """
+        Calculates height and width of the transformed shape with given size.
+        """
+        return tuple(np.abs(self.matrix) @ size)
+
+    def offset(self, size: PosType) -> PosType:
+        """
+        Calculates shift that returns the upper left corner of
+        the transformed shape with given size back to zero.
+        """
+        height, width = size
+        corners = np.array([(0, 0), (height, 0), (0, width), (height, width)])
+        return tuple(-np.min(corners @ self.matrix.T, axis=0))
 
 
 @dataclass(eq=True, frozen=True)
@@ -25,6 +86,9 @@ class FormPosColor:
     """
     pos: PosType
     color: ColorType
+    # hash is left as is, so the order of the untransformed elements
+    # in sets, and therefore the greedy chain building, doesn't change
+    transform: Transform = field(default=Transform.R0, hash=False)
 
     def squared_distance(self, other: "FormPosColor") -> int:
         """
@@ -54,6 +118,9 @@ class FormPosColor:
 
             # all other elements are compared by distance beetween them
             dist,
+
+            # elements with the same flip and rotation are closer
+            self.transform != other.transform,
         )
 
     def take_closest(self, next_frame: set["FormPosColor"]):
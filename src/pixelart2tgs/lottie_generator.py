@@ -1,48 +1,260 @@
+from dataclasses import replace
+import math
+
 from .converter_types import *
 from . import templates
+from .profiles import FPS, STICKER, Profile
 
 from .shape_generator import generate_shapes
 from .contour_generator import generate_contours
-from .chain_generator import generate_chains
+from .chain_generator import STROKE, generate_chains
+from .motion_generator import ChainContoursType, generate_motion_groups
+
+AnalysisType = tuple[SourceAnimationType, list[ChainContoursType]]
+
+# frames a shape can be missing for, without splitting its layer
+MAX_GAP = 2
 
 
 def get_image_sizes(source: SourceAnimationType) -> tuple[int, int]:
     return source[1][0].shape[:2]
 
 
-def shift_and_scale(source: SourceAnimationType):
+def shift_and_scale(source: SourceAnimationType, canvas: int = 512):
     """
     Generates shift of the whole animation to center it
     and scale to fill most of the avaliable sticker's space.
     """
     x, y = get_image_sizes(source)
 
-    scale = 512 / max(x, y)
+    half = canvas / 2
+
+    scale = canvas / max(x, y)
     if x > y:
-        shift = ((1 - y / x) * 256, 0.0)
+        shift = ((1 - y / x) * half, 0.0)
     else:
-        shift = (0.0, (1 - x / y) * 256)
+        shift = (0.0, (1 - x / y) * half)
     return shift, scale
 
 
-def generate_lottie(source: SourceAnimationType, label: str):
+def analyze_source(source: SourceAnimationType,
+                   canonicalize: bool = False) -> AnalysisType:
     """
-    Generates final lottie json by applying functions from all modules.
-    """
-    durations, shape_dict = generate_shapes(source)
+    Runs the expensive part of the conversion: splits animation into
+    shapes, generates their contours and chains.
+    The result is shared by all output profiles.
 
-    shift, scale = shift_and_scale(source)
-    length = round(sum(durations), 1)
+    If `canonicalize` is set, flipped and rotated copies of a shape share
+    contours and chains, which are animated by group scale and rotation.
+    """
+    _, shape_dict = generate_shapes(source, canonicalize)
 
-    groups = []
+    chains = []
 
     for shape, frames in shape_dict.items():
         contours = generate_contours(shape)
-        chains = generate_chains(frames)
+        chains += [(chain, contours) for chain in generate_chains(frames)]
+
+    return source, chains
+
+
+def generate_groups(chains: list[ChainContoursType],
+                    durations: DurationsType,
+                    scale: float,
+                    group_motion: bool = False,
+                    layered: bool = False,
+                    seam: str = STROKE,
+                    frames: Optional[list[np.ndarray]] = None) -> list[dict]:
+    """
+    Generates lottie groups from chains.
+    """
+    if group_motion:
+        return generate_motion_groups(chains, durations, scale, layered, seam,
+                                      frames)
+
+    return [
+        chain.generate_group(contours, durations, scale, None, layered, seam,
+                             frames) for chain, contours in chains
+    ]
+
+
+def generate_span_layers(chains: list[ChainContoursType],
+                         durations: DurationsType,
+                         shift: tuple[float, float],
+                         scale: float,
+                         group_motion: bool = False,
+                         max_gap: int = MAX_GAP,
+                         seam: str = STROKE,
+                         frames: Optional[list[np.ndarray]] = None
+                         ) -> list[dict]:
+    """
+    Generates layers that exist only while their chains are visible,
+    so that the player can skip invisible groups entirely instead of
+    evaluating their opacity.
+
+    Chains are split at gaps longer than `max_gap` frames, chains with
+    the same span share one layer.
+    """
+    spans: defaultdict[tuple, list[ChainContoursType]] = defaultdict(list)
+
+    for chain, contours in chains:
+        for piece in chain.split(max_gap):
+            spans[piece.span(durations)].append((piece, contours))
+
+    return [
+        templates.layer(
+            shift,
+            scale,
+            generate_groups(span_chains, durations, scale, group_motion,
+                            True, seam, frames),
+            end,
+            start,
+        ) for (start, end), span_chains in sorted(spans.items())
+    ]
+
+
+def count_opacity_keyframes(lottie: dict) -> int:
+    """
+    Counts opacity keyframes of all groups of the lottie json.
+    """
+
+    def count(items: list[dict]) -> int:
+        amount = 0
+        for item in items:
+            if item["ty"] == "gr":
+                amount += count(item["it"])
+            elif item["ty"] == "tr" and item["o"].get("a"):
+                amount += len(item["o"]["k"])
+        return amount
+
+    return sum(count(layer["shapes"]) for layer in lottie["layers"])
+
+
+def estimate_paint_cost(lottie: dict) -> tuple[float, float]:
+    """
+    Estimates the player's work to draw one frame: amount of paint
+    operations (fills and strokes) and amount of path vertices they paint.
+    Every paint operation paints all paths above it in its group.
+    Layers are counted for the share of the animation they exist.
+    """
+
+    def count(items: list[dict]) -> tuple[int, int]:
+        operations = painted = vertices = 0
+        for item in items:
+            if item["ty"] == "gr":
+                group_operations, group_painted = count(item["it"])
+                operations += group_operations
+                painted += group_painted
+            elif item["ty"] == "sh":
+                vertices += len(item["ks"]["k"]["v"])
+            elif item["ty"] in ("fl", "st"):
+                operations += 1
+                painted += vertices
+        return operations, painted
+
+    operations = painted = 0.0
+    for layer in lottie["layers"]:
+        share = (layer["op"] - layer["ip"]) / lottie["op"]
+        layer_operations, layer_painted = count(layer["shapes"])
+        operations += layer_operations * share
+        painted += layer_painted * share
+
+    return round(operations, 1), round(painted, 1)
+
+
+def merge_short_frames(
+        durations: DurationsType) -> tuple[DurationsType, list[int]]:
+    """
+    Merges consecutive frames shorter than one frame of the final animation,
+    so that every frame starts at a whole frame time. Every merged frame
+    shows its first frame for the total duration of the merged ones,
+    the last one also takes the remainder of the animation, so its length
+    doesn't change.
+    Returns new durations and indexes of kept frames.
+    """
+    merged_durations: DurationsType = []
+    kept = []
+    start = None  # first frame of the currently merged ones
+    time = end = 0
+
+    for index, duration in enumerate(durations):
+        if start is None:
+            start = index
+
+        time += duration
+        # halves are always rounded up, unlike round() does
+        frame_end = math.floor(time + 0.5)
+        if frame_end > end:
+            merged_durations.append(frame_end - end)
+            kept.append(start)
+            end = frame_end
+            start = None
+
+    if not kept:  # the whole animation is shorter than one frame
+        return [time], [0]
+
+    merged_durations[-1] += time - end
+    return merged_durations, kept
+
+
+def render_lottie(analysis: AnalysisType,
+                  profile: Profile = STICKER,
+                  group_motion: bool = False,
+                  layered: bool = False,
+                  max_gap: int = MAX_GAP,
+                  seam: str = STROKE):
+    """
+    Generates final lottie json for one output profile.
 
-        groups += [
-            chain.generate_group(contours, durations, scale)
-            for chain in chains
-        ]
+    If `group_motion` is set, chains moving together share one
+    animated position (see `generate_motion_groups`).
 
-    return templates.lottie(length, label, shift, scale, groups)
\ No newline at end of file
+    If `layered` is set, chains are placed into layers by the time
+    they are visible (see `generate_span_layers`).
+
+    `seam` is the way of hiding seams between adjacent shapes,
+    one of `SEAM_STRATEGIES`.
+
+    For profiles with lower frame rate, source frames are merged
+    (see `merge_short_frames`), so keyframes land on whole frames.
+    """
+    source, chains = analysis
+    durations, frames = source[0], source[1]
+
+    if profile.fps != FPS:
+        # converts frames amount from converter's timeline to profile's one
+        durations = [d * profile.fps / FPS for d in durations]
+
+    if profile.fps < FPS:
+        # frames shorter than one frame of the profile can't be shown anyway
+        durations, kept = merge_short_frames(durations)
+        chains = [(resampled, contours) for chain, contours in chains
+                  if (resampled := chain.resample(kept))]
+        frames = [frames[index] for index in kept]
+
+    shift, scale = shift_and_scale(source, profile.canvas)
+    length = round(sum(durations), 1)
+
+    if layered:
+        layers = generate_span_layers(chains, durations, shift, scale,
+                                      group_motion, max_gap, seam, frames)
+    else:
+        groups = generate_groups(chains, durations, scale, group_motion,
+                                 False, seam, frames)
+        layers = [templates.layer(shift, scale, groups, length)]
+
+    return templates.lottie(length, profile.label, layers, profile.canvas,
+                            profile.fps)
+
+
+def generate_lottie(source: SourceAnimationType,
+                    label: str,
+                    canonicalize: bool = False,
+                    group_motion: bool = False):
+    """
+    Generates final lottie sticker json by applying functions
+    from all modules.
+    """
+    analysis = analyze_source(source, canonicalize)
+    profile = replace(STICKER, label=label)
+    return render_lottie(analysis, profile, group_motion)
\ No newline at end of file
@@ -0,0 +1,68 @@
+from .converter_types import *
+from . import templates
+
+from .chain_generator import STROKE, Chain
+
+ChainContoursType = tuple[Chain, list[ContourType]]
+
+
+def is_moving(deltas: tuple) -> bool:
+    """
+    Checks if position deltas describe any movement at all.
+    """
+    return any(delta not in (None, (0, 0)) for delta in deltas)
+
+
+def generate_motion_groups(chains: list[ChainContoursType],
+                           durations: DurationsType,
+                           scale: float,
+                           layered: bool = False,
+                           seam: str = STROKE,
+                           frames: Optional[list[np.ndarray]] = None
+                           ) -> list[dict]:
+    """
+    Generates lottie groups from chains, nesting chains that move
+    by identical deltas in the same frames (like parts of one multi-color
+    sprite) into a parent group with one shared animated transform.
+
+    Nested groups get static positions relative to the parent, so
+    the movement is written to the final file only once.
+
+    For `layered` see `Chain.generate_opacity`,
+    for `seam` and `frames` see `Chain.generate_group`.
+    """
+    motions: defaultdict[tuple, list[ChainContoursType]] = defaultdict(list)
+
+    for chain, contours in chains:
+        motions[chain.motion(contours)].append((chain, contours))
+
+    groups = []
+
+    for (_, deltas), members in motions.items():
+        # grouping a single or static chain gives nothing
+        if len(members) == 1 or not is_moving(deltas):
+            groups += [
+                chain.generate_group(contours, durations, scale, None,
+                                     layered, seam, frames)
+                for chain, contours in members
+            ]
+            continue
+
+        # first chain of the set leads the movement of the parent group
+        leader, leader_contours = members[0]
+        parent_pos = leader.lottify_positions(leader_contours)[0]
+
+        children = [
+            chain.generate_group(contours, durations, scale, parent_pos,
+                                 layered, seam, frames)
+            for chain, contours in members
+        ]
+
+        groups.append(
+            templates.parent_group(
+                children,
+                leader.generate_opacity(durations, layered),
+                leader.generate_position(leader_contours, durations),
+            ))
+
+    return groups
@@ -0,0 +1,41 @@
+from dataclasses import dataclass
+from pathlib import Path
+
+SIZE_64KB = 1 << 16
+SIZE_1MB = 1 << 20
+
+FPS = 60  # frame rate of the converter's timeline
+
+DEFAULT_LABEL = "Made by t.me/sliva0 script"
+
+
+@dataclass(frozen=True)
+class Profile:
+    """
+    Dataclass with parameters of a specific output target.
+
+    All profiles of one source are rendered from the same shapes,
+    contours and chains, only the canvas, scale and timing differ.
+    """
+    name: str
+    canvas: int  # width and height of the lottie canvas
+    fps: int  # frame rate of the final animation
+    max_size: int  # maximum size of the compressed file in bytes
+    suffix: str = ""  # added to the output file name
+    label: str = DEFAULT_LABEL
+
+    def output_path(self, path: Path) -> Path:
+        """
+        Adds profile suffix to the output file name:
+        `sticker.tgs` -> `sticker.emoji.tgs`
+        """
+        return path.with_name(path.stem + self.suffix + path.suffix)
+
+
+STICKER = Profile("sticker", canvas=512, fps=FPS, max_size=SIZE_64KB)
+EMOJI = Profile("emoji", canvas=100, fps=FPS, max_size=SIZE_64KB,
+                suffix=".emoji")
+PREVIEW = Profile("preview", canvas=512, fps=FPS // 2, max_size=SIZE_64KB,
+                  suffix=".preview")
+
+PROFILES = {profile.name: profile for profile in (STICKER, EMOJI, PREVIEW)}
@@ -1,15 +1,35 @@
+from functools import lru_cache
+
 from scipy import ndimage
 
 from .converter_types import *
 
+# part of the frame, above which `update_frame_shapes` segments
+# the whole frame instead of the touched shapes only
+MAX_UPDATE_AREA = 0.5
+
+
+def unpack_source(
+    source: SourceAnimationType
+) -> tuple[DurationsType, list[np.ndarray], UpdateBoxesType]:
+    """
+    Gets durations, frames and update boxes of the animation,
+    missing update boxes are replaced by None (whole frame is updated).
+    """
+    durations, frames, *boxes = source
+    return durations, frames, boxes[0] if boxes else [None] * len(frames)
+
 
 def get_frame_colors(frame: np.ndarray) -> np.ndarray:
     """
     Gets list of all unique colors from one frame.
     """
     x, y, z = frame.shape
-    pixels = frame.reshape(x * y, z)  # pixel color list
-    colors = np.unique(pixels, axis=0)  # get all unique colors
+    pixels = frame.view(np.uint32).reshape(x * y)  # RGBA as one int
+    colors = np.unique(pixels).view(np.uint8).reshape(-1, z)
+
+    # sorts colors by channels, as if they were unique rows of the frame
+    colors = colors[np.lexsort(colors.T[::-1])]
 
     # returns only those colors where the last value is non-zero,
     # which means they aren't completely transparent
@@ -57,14 +77,72 @@ def normalize_shape(shape: np.ndarray) -> tuple[ShapeType, PosType]:
     return frozenset(map(tuple, pixels)), tuple(upper_left_corner)
 
 
-def extract_frame_shapes(frame: np.ndarray) -> FrameShapesType:
+@lru_cache(maxsize=None)
+def canonicalize_shape(shape: ShapeType) -> tuple[ShapeType, Transform]:
+    """
+    Selects the smallest form of the normalized shape among all its
+    flips and rotations, so mirrored and rotated copies of the same shape
+    become one shape.
+    Returns canonical shape and the `Transform` that turns it back
+    into the original shape.
+    ``` plain
+    [1 1]  ->  [1 1]    transform = R90 (rotated clockwise
+    [_ 1]      [1 _]    by 90 degrees gives the original)
+    ```
+    """
+    pixels = np.array(list(shape))
+    variants = []
+
+    for transform in Transform:
+        # applies inverse transform (transposed matrix) to every pixel
+        moved = pixels @ transform.matrix
+        moved -= np.min(moved, axis=0)  # shifts back to the upper left corner
+        variants.append((sorted(map(tuple, moved)), transform))
+
+    # symmetric shapes give equal forms, in this case
+    # the first one is taken, which is the identity transform
+    form, transform = min(variants, key=lambda variant: variant[0])
+    return frozenset(form), transform
+
+
+@lru_cache(maxsize=None)
+def get_shape_size(shape: ShapeType) -> PosType:
+    """
+    Gets height and width of the normalized shape.
+    """
+    return tuple(np.max(list(shape), axis=0) + 1)
+
+
+def place_shape(shape: ShapeType, element: FormPosColor) -> np.ndarray:
+    """
+    Gets array of frame coordinates of every pixel of the shape
+    placed in the frame as described by `FormPosColor`.
+    """
+    pixels = np.array(list(shape)) @ element.transform.matrix.T
+    return pixels - np.min(pixels, axis=0) + element.pos
+
+
+def extract_frame_shapes(frame: np.ndarray,
+                         canonicalize: bool = False,
+                         origin: PosType = (0, 0),
+                         dirty: Optional[np.ndarray] = None,
+                         shapes: Optional[FrameShapesType] = None
+                         ) -> FrameShapesType:
     """
     Creates dict with keys - shapes and values - sets of `FormPosColor`
     for a specific shape in the frame.
+
+    If `canonicalize` is set, flipped and rotated shapes are
+    merged into one canonical shape (see `canonicalize_shape`).
+
+    To segment only a part of the frame (see `update_frame_shapes`),
+    `frame` is cropped, `origin` is the position of the crop in the full
+    frame, only shapes touching `dirty` mask are added to `shapes` dict.
     """
     colors = get_frame_colors(frame)
 
-    shapes: FrameShapesType = defaultdict(set)
+    if shapes is None:
+        shapes = defaultdict(set)
 
     for color in colors:
         # creates matrix with ones in place of pixels of current color
@@ -74,25 +152,133 @@ def extract_frame_shapes(frame: np.ndarray) -> FrameShapesType:
         labels, amount = ndimage.label(color_mask)
 
         for label_number in range(1, amount + 1):
-            shape, shape_shift = normalize_shape(labels == label_number)
+            shape_mask = labels == label_number
+
+            # skips shapes that weren't changed since the previous frame
+            if dirty is not None and not np.any(shape_mask[:-1, :-1] & dirty):
+                continue
+
+            shape, shape_shift = normalize_shape(shape_mask)
+            shape_shift = (shape_shift[0] + origin[0],
+                           shape_shift[1] + origin[1])
+
+            transform = Transform.R0
+            if canonicalize:
+                shape, transform = canonicalize_shape(shape)
+
             # adds every mormalized shape's color and pos pair into final dict
-            shapes[shape].add(FormPosColor(shape_shift, tuple(color)))
+            shapes[shape].add(
+                FormPosColor(shape_shift, tuple(color), transform))
 
     return shapes
 
 
+def update_frame_shapes(previous: FrameShapesType,
+                        frame: np.ndarray,
+                        box: BoxType,
+                        canonicalize: bool = False) -> FrameShapesType:
+    """
+    Creates the same dict as `extract_frame_shapes`, but segments only
+    shapes that touch the updated box of the frame. All other shapes are
+    carried forward from the dict of the previous frame unchanged.
+
+    If touched shapes cover most of the frame (like an opaque background),
+    the whole frame is segmented again, which is cheaper.
+    """
+    height, width = frame.shape[:2]
+    top, left, bottom, right = box
+
+    shapes: FrameShapesType = defaultdict(set)
+
+    if top >= bottom or left >= right:
+        # nothing changed since the previous frame
+        for shape, elements in previous.items():
+            shapes[shape] = set(elements)
+        return shapes
+
+    # grows the box by one pixel, since changed pixels can merge
+    # or split adjacent shapes of the same color
+    top, left = max(top - 1, 0), max(left - 1, 0)
+    bottom, right = min(bottom + 1, height), min(right + 1, width)
+
+    # area to segment again, grows to fit every touched shape entirely
+    crop = (top, left, bottom, right)
+    max_area = height * width * MAX_UPDATE_AREA
+
+    for shape, elements in previous.items():
+        size = get_shape_size(shape)
+
+        for element in elements:
+            shape_top, shape_left = element.pos
+            shape_bottom, shape_right = np.add(
+                element.pos, element.transform.placed_size(size))
+
+            # cheap bounding box check goes first
+            if (shape_bottom <= top or shape_top >= bottom
+                    or shape_right <= left or shape_left >= right):
+                shapes[shape].add(element)
+                continue
+
+            grown = (
+                min(crop[0], shape_top),
+                min(crop[1], shape_left),
+                max(crop[2], shape_bottom),
+                max(crop[3], shape_right),
+            )
+
+            # whole frame segmentation gives the same result,
+            # so the shape isn't even checked pixel by pixel
+            if (grown[2] - grown[0]) * (grown[3] - grown[1]) > max_area:
+                return extract_frame_shapes(frame, canonicalize)
+
+            rows, cols = place_shape(shape, element).T
+            if not np.any((rows >= top) & (rows < bottom)
+                          & (cols >= left) & (cols < right)):
+                shapes[shape].add(element)
+                continue
+
+            crop = grown
+
+    crop_top, crop_left, crop_bottom, crop_right = crop
+
+    dirty = np.zeros((crop_bottom - crop_top, crop_right - crop_left),
+                     dtype=bool)
+    dirty[top - crop_top:bottom - crop_top,
+          left - crop_left:right - crop_left] = True
+
+    return extract_frame_shapes(
+        frame[crop_top:crop_bottom, crop_left:crop_right],
+        canonicalize,
+        (crop_top, crop_left),
+        dirty,
+        shapes,
+    )
+
+
 def generate_shapes(
-        source: SourceAnimationType
+    source: SourceAnimationType,
+    canonicalize: bool = False,
 ) -> tuple[DurationsType, AnimationShapesType]:
     """
     Passes durations of frames and creates dict with keys - shapes
     and values - lists of sets of `FormPosColor` for every frame.
+
+    Frames with known update boxes are segmented incrementally
+    on top of the previous frame (see `update_frame_shapes`).
     """
 
-    durations, frames = source
+    durations, frames, boxes = unpack_source(source)
 
     shape_dict: AnimationShapesType = defaultdict(list)
-    frames_shapes = list(map(extract_frame_shapes, frames))
+    frames_shapes: list[FrameShapesType] = []
+
+    for frame, box in zip(frames, boxes):
+        if box is None or not frames_shapes:
+            frame_shapes = extract_frame_shapes(frame, canonicalize)
+        else:
+            frame_shapes = update_frame_shapes(frames_shapes[-1], frame, box,
+                                               canonicalize)
+        frames_shapes.append(frame_shapes)
 
     # iterates over every unique shape in animation
     for shape in set().union(*frames_shapes):
@@ -1,19 +1,28 @@
-def lottie(length: float, label: str, shift: tuple[float, float], scale: float,
-           shapes: list[dict]):
+from typing import Optional
+
+
+def lottie(length: float,
+           label: str,
+           layers: list[dict],
+           canvas: int = 512,
+           fps: int = 60):
     return {
         "v": "5.7.2",  # hardcoded version of format
-        "fr": 60,  # frames per second
+        "fr": fps,  # frames per second
         "ip": 0,  # start frame index
         "op": length,  # end frame index
-        "w": 512,  # resolution
-        "h": 512,
+        "w": canvas,  # resolution
+        "h": canvas,
         "nm": label,  # name
-        "layers": (layer(shift, scale, shapes, length), )  # one layer 
+        "layers": layers
     }
 
 
-def layer(shift: tuple[float, float], scale: float, groups: list[dict],
-          length: float):
+def layer(shift: tuple[float, float],
+          scale: float,
+          groups: list[dict],
+          length: float,
+          start: float = 0):
     return {
         "ty": 4,  # layer type, 4 is common 
         "ks": {  # layers specs
@@ -22,41 +31,93 @@ def layer(shift: tuple[float, float], scale: float, groups: list[dict],
             # a (anchor), o (opacity) and r (rotation) skipped
         },
         "shapes": groups,  # elements of the layer
-        "ip": 0,  # start frame
+        "ip": start,  # start frame
         "op": length  # end frame
     }
 
 
-def group(contours: list[dict], scale: float, color, opacity, position):
+def group(contours: list[dict],
+          scale: float,
+          color,
+          opacity,
+          position,
+          transform_scale=None,
+          rotation=None,
+          stroke: bool = True,
+          edges: Optional[list[dict]] = None):
+    transform = {
+        "ty": "tr",  # type - transform (required in groups)
+        "p": position,  # group position
+        "o": opacity  # group opacity
+    }
+    if transform_scale is not None:
+        transform["s"] = transform_scale  # group scale, negative to flip
+    if rotation is not None:
+        transform["r"] = rotation  # group rotation
+
+    items = [
+        *contours,  # all contours
+        {
+            "ty": "mm",  # thing that combines all contours
+            "mm": 1  # in the right way
+        },
+    ]
+    if stroke:
+        items.append(seam_stroke(color, scale))
+    items.append({
+        "ty": "fl",  # type - fill
+        "c": color
+    })
+    if edges:
+        # separate group, so the edges are neither merged nor filled
+        items.append(edges_group(edges, color, scale))
+    items.append(transform)
+
     return {
-        "ty":
-        "gr",  # shape type - group
-        "it": [  # list of group subshapes
-            *contours,  # all contours
-            {
-                "ty": "mm",  # thing that combines all contours
-                "mm": 1  # in the right way
-            },
-            {
-                "ty": "st",  # type - stroke
-                "c": color,
-                "o": static_value(50),  # opacity
-                "w": static_value(0.5 / scale)  # stroke width
-            },
+        "ty": "gr",  # shape type - group
+        "it": items,  # list of group subshapes
+    }
+
+
+def seam_stroke(color, scale: float):
+    return {
+        "ty": "st",  # type - stroke
+        "c": color,
+        "o": static_value(50),  # opacity
+        "w": static_value(0.5 / scale)  # stroke width
+    }
+
+
+def edges_group(edges: list[dict], color, scale: float):
+    return {
+        "ty": "gr",  # shape type - group
+        "it": [
+            *edges,  # open contours
+            seam_stroke(color, scale),
             {
-                "ty": "fl",  # type - fill
-                "c": color
+                "ty": "tr",  # type - transform (required in groups)
+                "p": static_value((0, 0)),
+                "o": static_value(100)
             },
+        ]
+    }
+
+
+def parent_group(groups: list[dict], opacity, position):
+    return {
+        "ty": "gr",  # shape type - group
+        "it": [  # list of nested groups
+            *groups,
             {
-                "ty": "tr",  # type - transform (required in groups)
-                "p": position,  # group position
-                "o": opacity  # group opacity
+                "ty": "tr",  # type - transform shared by all nested groups
+                "p": position,
+                "o": opacity
             },
         ]
     }
 
 
-def contour(points: list[tuple[int, int]]):
+def contour(points: list[tuple[int, int]], closed: bool = True):
     curves = blank_curves(len(points))
     return {
         "ty":
@@ -66,7 +127,7 @@ def contour(points: list[tuple[int, int]]):
             "i": curves,  # parameters that define the curvature of the line
             "o": curves,  # filled with empty lists to straight line
             "v": points,  # contour vertices
-            "c": True  # cycled (first vertice connected to last)
+            "c": closed  # cycled (first vertice connected to last)
         }),
     }
 